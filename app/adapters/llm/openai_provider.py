@@ -4,17 +4,21 @@ LLM sağlayıcı adaptörü.
 Şimdilik OpenAI (LangChain community) kullanıyoruz.
 """
 
+from functools import lru_cache
 from typing import Optional
+
 from app.core.config import settings
 
 from langchain_community.chat_models import ChatOpenAI
 
 
+@lru_cache(maxsize=8)
 def get_chat_llm(temperature: float = 0.2, model: Optional[str] = None) -> ChatOpenAI:
     """
     Tek yerden Chat LLM örneği döndürür.
     - MODEL: env'den okunur; override için parametre.
     - Temperature: default 0.2 (daha deterministik).
+    - Ayni (temperature, model) icin tek istemci paylasilir (HTTP havuzu yeniden kullanilir).
     """
     chosen = model or settings.llm_model
     return ChatOpenAI(model=chosen, temperature=temperature)
@@ -8,9 +8,13 @@ Chroma VectorStore adaptoru.
 
 from __future__ import annotations
 
+import hashlib
 import os
-from typing import Dict, Iterable, Optional
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
 
+import chromadb
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.embeddings import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
@@ -26,6 +30,31 @@ def get_embeddings():
     return OpenAIEmbeddings()
 
 
+# Sorgu embedding'leri icin surec capinda LRU; tekrarlanan sorularda
+# embedding API cagrisini tamamen kaldirir. asyncio.to_thread worker
+# thread'lerinden cagrildigi icin erisimler kilit altinda yapilir
+# (kilit maliyeti, cache'lenen embedding cagrisinin yaninda gurultu).
+_embed_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+_embed_cache_lock = threading.Lock()
+_EMBED_CACHE_MAX = 4096
+
+
+def embed_query_cached(embedder, text: str) -> List[float]:
+    """Ayni (normalize edilmis) sorguyu ikinci kez embed etmez."""
+    key = hashlib.sha256(text.strip().lower().encode("utf-8")).hexdigest()
+    with _embed_cache_lock:
+        cached = _embed_cache.get(key)
+        if cached is not None:
+            _embed_cache.move_to_end(key)
+            return cached
+    embedding = embedder.embed_query(text)
+    with _embed_cache_lock:
+        _embed_cache[key] = embedding
+        while len(_embed_cache) > _EMBED_CACHE_MAX:
+            _embed_cache.popitem(last=False)
+    return embedding
+
+
 def _default_collection_name() -> str:
     tenant = settings.default_tenant_id or "default"
     return f"{tenant}_default"
@@ -40,10 +69,40 @@ def load_or_create_chroma(
     persist_dir = persist_dir or settings.persist_dir
     os.makedirs(persist_dir, exist_ok=True)
     collection = collection_name or _default_collection_name()
+    client = chromadb.PersistentClient(path=persist_dir)
+
+    # Yeni koleksiyonlar cosine uzayi ile kurulur. Mevcut koleksiyonlarda uzay
+    # sonradan degistirilemez; relevance skor fonksiyonunun yanlis uzaya gore
+    # secilmemesi icin gercek hnsw:space okunur ve ayni degerle gecirilir.
+    # search_ef calisma zamani parametresi oldugundan modify ile uygulanir.
+    space = "cosine"
+    try:
+        existing = client.get_collection(collection)
+    except Exception:
+        existing = None
+    if existing is not None:
+        meta = dict(existing.metadata or {})
+        space = meta.get("hnsw:space", "l2")
+        if meta.get("hnsw:search_ef") != settings.chroma_search_ef:
+            try:
+                meta["hnsw:search_ef"] = settings.chroma_search_ef
+                existing.modify(metadata=meta)
+            except Exception as exc:  # pragma: no cover
+                print("[load_or_create_chroma] search_ef modify failed:", exc)
+
     return Chroma(
+        client=client,
         persist_directory=persist_dir,
         collection_name=collection,
         embedding_function=get_embeddings(),
+        # k=6'lik aramalarda dusuk search_ef graf gezinmesini belirgin kisaltir,
+        # recall kaybi ihmal edilebilir.
+        collection_metadata={
+            "hnsw:space": space,
+            "hnsw:search_ef": settings.chroma_search_ef,
+            "hnsw:M": 16,
+            "hnsw:construction_ef": 128,
+        },
     )
 
 
@@ -117,7 +176,9 @@ def retrieve_context(
     *,
     tenant_id: Optional[str],
     k: int = 6,
-) -> str:
+    query_embedding: Optional[List[float]] = None,
+) -> Tuple[str, float]:
+    """Baglam metnini ve en iyi benzerlik skorunu (0-1) birlikte dondurur."""
     filters = _build_filter(tenant_id)
     # Diagnostics for quick triage
     persist_dir = getattr(vector, "_persist_directory", None) or getattr(vector, "persist_directory", None) or settings.persist_dir
@@ -132,6 +193,23 @@ def retrieve_context(
         "filter=", filters,
         "tenant=", tenant_id,
     )
-    docs = vector.similarity_search(query, k=k, filter=filters)
-    print("[retrieve_context] found_docs=", len(docs))
-    return "\n\n".join([d.page_content for d in docs])
+    # Cagiran embedding'i zaten hesapladiysa ayni sorgu icin ikinci bir
+    # embedding API cagrisina gerek yok.
+    if query_embedding is not None:
+        # Dikkat: by_vector varyanti ham mesafe dondurur (dusuk = daha benzer).
+        # Diger dalla ayni yuksek-iyi 0-1 skalasina cevirmek icin store'un
+        # kendi relevance fonksiyonu uygulanir.
+        relevance_fn = vector._select_relevance_score_fn()
+        results = [
+            (doc, relevance_fn(distance))
+            for doc, distance in vector.similarity_search_by_vector_with_relevance_scores(
+                query_embedding, k=k, filter=filters
+            )
+        ]
+    else:
+        results = vector.similarity_search_with_relevance_scores(query, k=k, filter=filters)
+    print("[retrieve_context] found_docs=", len(results))
+    if not results:
+        return "", 0.0
+    top_score = max(score for _, score in results)
+    return "\n\n".join([doc.page_content for doc, _ in results]), top_score
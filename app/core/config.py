@@ -24,6 +24,13 @@ class Settings(BaseModel):
     init_llm_on_startup: bool = os.getenv("INIT_LLM_ON_STARTUP", "true").lower() == "true"
     init_vector_on_startup: bool = os.getenv("INIT_VECTOR_ON_STARTUP", "true").lower() == "true"
 
+    vector_cache_max: int = int(os.getenv("VECTOR_CACHE_MAX", "32"))
+    rag_min_score: float = float(os.getenv("RAG_MIN_SCORE", "0.25"))
+    chroma_search_ef: int = int(os.getenv("CHROMA_SEARCH_EF", "48"))
+    max_llm_concurrency: int = int(os.getenv("MAX_LLM_CONCURRENCY", "8"))
+    llm_batch_max_size: int = int(os.getenv("LLM_BATCH_MAX_SIZE", "16"))
+    llm_batch_window_ms: float = float(os.getenv("LLM_BATCH_WINDOW_MS", "20"))
+
     rate_limit_max_requests: int = int(os.getenv("RATE_LIMIT_MAX_REQUESTS", "20"))
     rate_limit_window_seconds: int = int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "60"))
     max_user_prompt_length: int = int(os.getenv("MAX_USER_PROMPT_LENGTH", "4000"))
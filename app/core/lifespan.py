@@ -9,6 +9,7 @@ from app.core.config import settings
 from app.core.db import create_engine_and_sessionmaker
 from app.core.rate_limit import RateLimiter
 from app.models.db_models import Tenant
+from app.services.rag_service import RagService
 
 logger = logging.getLogger(__name__)
 
@@ -105,6 +106,11 @@ async def lifespan(app):
                 collection_name=default_collection_id,
             )
             logger.info("Vector store loaded (default collection: %s).", default_collection_id)
+
+            # Tenant koleksiyonlarini istek yoluna dusmeden once isit;
+            # ilk kullanici cold-start HNSW yukleme bedelini odemesin.
+            await RagService().prewarm(str(tenant_id) for tenant_id in tenant_ids)
+            logger.info("Vector caches prewarmed for %d tenant(s).", len(tenant_ids))
         if settings.init_llm_on_startup:
             logger.info("Initializing LLM...")
             from app.adapters.llm.openai_provider import get_chat_llm
@@ -3,6 +3,7 @@ import logging
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from sqlalchemy import select
 
 from app.api.routes.chat import router as chat_router
@@ -24,6 +25,7 @@ app = FastAPI(
     description="Document Based Chatbot API",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Register specific routes before generic ones to avoid conflicts
@@ -5,7 +5,7 @@ import uuid
 from datetime import datetime, timezone
 from typing import Dict, Optional
 
-from sqlalchemy import update
+from sqlalchemy import insert, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
@@ -32,19 +32,23 @@ class ChatRepo:
         safe_content = sanitize_text(content, max_length=settings.max_user_prompt_length)
         session_uuid = uuid.UUID(session_id)
 
-        message = ChatMessage(
-            tenant_id=str(tenant_id),
-            session_id=session_uuid,
-            message_role=role,
-            content=safe_content,
-            model=model,
-            latency_ms=latency_ms or 0,
-            prompt_tokens=prompt_t,
-            completion_tokens=completion_t,
-            total_tokens=total_t,
+        # Core INSERT ... RETURNING: ORM unit-of-work/identity-map maliyetini atlar.
+        stmt = (
+            insert(ChatMessage)
+            .values(
+                tenant_id=str(tenant_id),
+                session_id=session_uuid,
+                message_role=role,
+                content=safe_content,
+                model=model,
+                latency_ms=latency_ms or 0,
+                prompt_tokens=prompt_t,
+                completion_tokens=completion_t,
+                total_tokens=total_t,
+            )
+            .returning(ChatMessage.id)
         )
-        session.add(message)
-        await session.flush()
+        message_id = (await session.execute(stmt)).scalar_one()
 
         await session.execute(
             update(ChatSession)
@@ -55,7 +59,7 @@ class ChatRepo:
             .values(last_activity_at=datetime.now(timezone.utc))
         )
 
-        return str(message.id)
+        return str(message_id)
 
     async def insert_history(
         self,
@@ -79,18 +83,19 @@ class ChatRepo:
         question = sanitize_text(req.question, max_length=settings.max_user_prompt_length)
         safe_answer = sanitize_text(answer, max_length=settings.max_user_prompt_length)
 
-        history_row = ChatHistory(
-            tenant_id=str(tenant_id),
-            session_id=uuid.UUID(session_id),
-            request_id=request_id,
-            ip=ip_val,
-            user_agent=ua_val,
-            model=settings.llm_model,
-            question=question,
-            answer=safe_answer,
-            latency_ms=latency_ms or 0,
-            prompt_tokens=prompt_t,
-            completion_tokens=completion_t,
-            total_tokens=total_t,
+        await session.execute(
+            insert(ChatHistory).values(
+                tenant_id=str(tenant_id),
+                session_id=uuid.UUID(session_id),
+                request_id=request_id,
+                ip=ip_val,
+                user_agent=ua_val,
+                model=settings.llm_model,
+                question=question,
+                answer=safe_answer,
+                latency_ms=latency_ms or 0,
+                prompt_tokens=prompt_t,
+                completion_tokens=completion_t,
+                total_tokens=total_t,
+            )
         )
-        session.add(history_row)
@@ -3,13 +3,15 @@ from __future__ import annotations
 
 import uuid
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Optional, Tuple
 
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import literal, select
+from sqlalchemy.dialects.postgresql import UUID, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.security import sanitize_metadata
-from app.models.db_models import ChatSession
+from app.core.config import settings
+from app.core.security import sanitize_metadata, sanitize_text
+from app.models.db_models import ChatMessage, ChatSession
 from app.models.schemas import ChatRequest
 
 
@@ -62,3 +64,62 @@ class SessionRepo:
         await session.flush()
         return str(new_session.id)
 
+    async def ensure_session_and_insert_user(
+        self,
+        session: AsyncSession,
+        req: ChatRequest,
+        tenant_id: uuid.UUID,
+        client_ip: Optional[str],
+        user_agent: Optional[str],
+    ) -> Tuple[str, str]:
+        """Upsert the chat session and insert the user message in one statement.
+
+        Tek bir INSERT ... ON CONFLICT CTE + INSERT ... RETURNING ile iki
+        round-trip yerine bir tane yapar.
+        """
+        ip_val = sanitize_metadata(client_ip, fallback="0.0.0.0", max_length=64)
+        ua_val = sanitize_metadata(user_agent, fallback="-", max_length=200)
+        last_activity = datetime.now(timezone.utc)
+        session_uuid = uuid.UUID(str(req.session_id)) if req.session_id else uuid.uuid4()
+        message_uuid = uuid.uuid4()
+        question = sanitize_text(req.question, max_length=settings.max_user_prompt_length)
+
+        session_cte = (
+            insert(ChatSession)
+            .values(
+                id=session_uuid,
+                tenant_id=str(tenant_id),
+                client_ip=ip_val,
+                user_agent=ua_val,
+                last_activity_at=last_activity,
+            )
+            .on_conflict_do_update(
+                index_elements=[ChatSession.id],
+                set_={
+                    "tenant_id": str(tenant_id),
+                    "last_activity_at": last_activity,
+                    "client_ip": ip_val,
+                    "user_agent": ua_val,
+                },
+            )
+            .returning(ChatSession.id)
+            .cte("upserted_session")
+        )
+        stmt = (
+            insert(ChatMessage)
+            .from_select(
+                ["id", "tenant_id", "session_id", "message_role", "content", "latency_ms"],
+                select(
+                    literal(message_uuid, type_=UUID(as_uuid=True)),
+                    literal(str(tenant_id), type_=UUID(as_uuid=True)),
+                    session_cte.c.id,
+                    literal("user"),
+                    literal(question),
+                    literal(0),
+                ),
+            )
+            .returning(ChatMessage.session_id, ChatMessage.id)
+        )
+        row = (await session.execute(stmt)).one()
+        return str(row.session_id), str(row.id)
+
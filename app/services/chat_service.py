@@ -1,12 +1,14 @@
 ﻿# app/services/chat_service.py
 from __future__ import annotations
 
+import asyncio
 import logging
 import math
 import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Optional, Tuple
 
 from fastapi import HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
@@ -30,6 +32,15 @@ from app.services.title_service import TitleService
 
 logger = logging.getLogger(__name__)
 
+# Saniye cozunurlugunde memoize edilmis UTC timestamp (tek event-loop thread'i icin yeterli).
+_ts_cache: list = [0, ""]
+
+# (tenant_id, session_id) -> (timestamp, memory_text). ChatService her istek icin
+# yeniden kuruldugundan cache modul seviyesinde tutulur.
+_memory_cache: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+_MEMORY_CACHE_TTL = 5.0
+_MEMORY_CACHE_MAX = 2048
+
 
 class ChatService:
     """High level coordinator for the chat flow."""
@@ -100,7 +111,7 @@ class ChatService:
         )
 
         xff = request.headers.get("x-forwarded-for", "")
-        forwarded_ip = xff.split(",")[0].strip() if xff else None
+        forwarded_ip = xff.partition(",")[0].strip() or None
         raw_ip = forwarded_ip or (request.client.host if request.client else None)
         client_ip = sanitize_metadata(raw_ip, fallback="0.0.0.0", max_length=64)
         user_agent = sanitize_metadata(request.headers.get("user-agent"), fallback="-", max_length=200)
@@ -123,28 +134,22 @@ class ChatService:
 
         async with self.session_factory() as session:
             async with session.begin():
-                session_id = await self.session_repo.ensure_session(
+                session_id, user_message_id = await self.session_repo.ensure_session_and_insert_user(
                     session=session,
                     req=payload,
                     tenant_id=safe_tenant_id,
                     client_ip=client_ip,
                     user_agent=user_agent,
                 )
-                await self.chat_repo.insert_message(
-                    session=session,
-                    tenant_id=safe_tenant_id,
-                    session_id=session_id,
-                    role="user",
-                    content=payload.question,
-                    model=None,
-                    latency_ms=None,
-                    usage=None,
-                )
 
         t0 = time.perf_counter()
+        # Soru prompt'a ayrica girdigi icin az once yazilan kullanici mesaji
+        # memory'den haric tutulur; boylece ilk mesajda memory bos kalir ve
+        # RagService'in semantik cevap cache'i devreye girebilir.
         memory_text = await self._safe_memory(
             tenant_id=str(safe_tenant_id),
             session_id=session_id,
+            exclude_message_id=user_message_id,
         )
         answer_result = await self.rag.answer(
             question=payload.question,
@@ -188,14 +193,23 @@ class ChatService:
                     first_question=payload.question,
                 )
 
+        # Yeni asistan mesaji yazildi; memoize edilmis memory artik bayat.
+        _memory_cache.pop((str(safe_tenant_id), session_id), None)
+
+        # Uzun cevaplarda regex temizligi event loop'u bloklamasin diye thread'e tasinir.
+        if len(answer_text) > 4096:
+            preview = await asyncio.to_thread(self._make_preview, answer_text)
+        else:
+            preview = self._make_preview(answer_text)
+
         return ChatResponse(
             answer=answer_text,
             files=file_payload,
-            tenant_id=safe_tenant_id,  
+            tenant_id=safe_tenant_id,
             session_id=session_id,
             session_title=self._fallback_title(payload.question),
             last_activity=self._utcnow_iso(),
-            preview=self._make_preview(answer_text),
+            preview=preview,
             message_id=msg_id,
         )
 
@@ -203,21 +217,35 @@ class ChatService:
         self,
         tenant_id: str,
         session_id: Optional[str],
+        exclude_message_id: Optional[str] = None,
     ) -> str:
         if not session_id:
             return ""
+        key = (tenant_id, session_id)
+        cached = _memory_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < _MEMORY_CACHE_TTL:
+            return cached[1]
         try:
-            return await self.memory.build_memory(
+            memory_text = await self.memory.build_memory(
                 tenant_id=tenant_id,
                 session_id=session_id,
+                exclude_message_id=exclude_message_id,
             )
         except Exception as exc:  # pragma: no cover
             logger.warning("memory build failed: %s", exc)
             return ""
+        _memory_cache[key] = (time.monotonic(), memory_text)
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > _MEMORY_CACHE_MAX:
+            _memory_cache.popitem(last=False)
+        return memory_text
 
     def _utcnow_iso(self) -> str:
-        dt = datetime.now(timezone.utc)
-        return dt.isoformat()
+        sec = int(time.time())
+        if _ts_cache[0] != sec:
+            _ts_cache[0] = sec
+            _ts_cache[1] = datetime.fromtimestamp(sec, tz=timezone.utc).isoformat()
+        return _ts_cache[1]
 
     def _fallback_title(self, first_question: str) -> str:
         first_line = (first_question or "").strip().splitlines()[0][:60]
@@ -243,8 +271,7 @@ class ChatService:
     def _sanitize_title(self, value: str) -> str:
         sanitized = (value or "").strip()
         sanitized = sanitized.replace("\n", " ").replace('"', "").replace("'", "")
-        while sanitized and sanitized[-1] in ".!?":
-            sanitized = sanitized[:-1]
+        sanitized = sanitized.rstrip(".!?")
         if len(sanitized) > 80:
             sanitized = sanitized[:80].rstrip()
         return sanitized
@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import logging
 import uuid
-from typing import Dict, List
+from typing import List, Optional, Tuple
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
@@ -20,14 +20,26 @@ class MemoryService:
 
     def __init__(self, session_factory: async_sessionmaker[AsyncSession]):
         self.session_factory = session_factory
+        self._summary_llm = None
 
     async def build_memory(
         self,
         tenant_id: str,
         session_id: str,
+        exclude_message_id: Optional[str] = None,
     ) -> str:
+        """Gecmisten memory metni kurar.
+
+        exclude_message_id ile henuz cevaplanmamis guncel kullanici mesaji
+        disarida birakilir; soru prompt'a zaten ayri alanda girer.
+        """
         try:
-            history = await self._get_conversation_history(tenant_id, session_id, limit=20)
+            history = await self._get_conversation_history(
+                tenant_id,
+                session_id,
+                limit=20,
+                exclude_message_id=exclude_message_id,
+            )
             if not history:
                 return ""
 
@@ -43,13 +55,13 @@ class MemoryService:
         tenant_id: str,
         session_id: str,
         limit: int = 20,
-    ) -> List[Dict]:
+        exclude_message_id: Optional[str] = None,
+    ) -> List[Tuple[str, str]]:
         session_uuid = uuid.UUID(session_id)
         stmt = (
             select(
                 ChatMessage.message_role,
                 ChatMessage.content,
-                ChatMessage.created_at,
             )
             .where(
                 ChatMessage.session_id == session_uuid,
@@ -59,29 +71,27 @@ class MemoryService:
             .order_by(ChatMessage.created_at.asc())
             .limit(limit)
         )
+        if exclude_message_id:
+            stmt = stmt.where(ChatMessage.id != uuid.UUID(str(exclude_message_id)))
 
         async with self.session_factory() as session:
             result = await session.execute(stmt)
             rows = result.all()
 
-        return [
-            {
-                "role": row.message_role,
-                "content": row.content,
-                "timestamp": row.created_at,
-            }
-            for row in rows
-        ]
+        return [(row.message_role, row.content) for row in rows]
 
-    async def _summarize(self, history: List[Dict]) -> str:
+    async def _summarize(self, history: List[Tuple[str, str]]) -> str:
         if len(history) < 4:
             return ""
         try:
-            llm = get_chat_llm(temperature=0.1, model=settings.llm_model_mini)
-            conversation_text = ""
-            for msg in history[:-2]:
-                role_label = "Kullanici" if msg["role"] == "user" else "Asistan"
-                conversation_text += f"{role_label}: {msg['content']}\n\n"
+            if self._summary_llm is None:
+                self._summary_llm = get_chat_llm(temperature=0.1, model=settings.llm_model_mini)
+            llm = self._summary_llm
+            parts = []
+            for role, content in history[:-2]:
+                role_label = "Kullanici" if role == "user" else "Asistan"
+                parts.append(f"{role_label}: {content}\n\n")
+            conversation_text = "".join(parts)
 
             summary_context = "kullanici"
             prompt = (
@@ -101,12 +111,12 @@ class MemoryService:
             logger.warning("summary error: %s", exc)
             return ""
 
-    def _format_recent(self, history: List[Dict], limit: int = 4) -> str:
+    def _format_recent(self, history: List[Tuple[str, str]], limit: int = 4) -> str:
         if not history:
             return ""
         recent = history[-limit:]
         lines = []
-        for msg in recent:
-            role_label = "Kullanici" if msg["role"] == "user" else "Asistan"
-            lines.append(f"{role_label}: {msg['content']}")
+        for role, content in recent:
+            role_label = "Kullanici" if role == "user" else "Asistan"
+            lines.append(f"{role_label}: {content}")
         return "Son Mesajlar:\n" + "\n".join(lines) + "\n\n"
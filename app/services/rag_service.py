@@ -1,23 +1,29 @@
 ﻿# app/services/rag_service.py
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
 import re
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import orjson
 
 from langchain_core.messages import AIMessage, FunctionMessage, HumanMessage
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import PromptTemplate
 
-from app.adapters.vectorstores.chroma_adapter import load_or_create_chroma, retrieve_context
+from app.adapters.vectorstores.chroma_adapter import (
+    embed_query_cached,
+    load_or_create_chroma,
+    retrieve_context,
+)
 from app.adapters.llm.openai_provider import get_chat_llm
 from app.core.config import settings
 # from app.services.tool_service import ToolExecutionError, ToolManager  # Tool calling disabled
 
-import uuid
-
 
 @dataclass
 class AnswerResult:
@@ -25,14 +31,229 @@ class AnswerResult:
     files: Optional[Dict[str, Any]] = None
 
 
+class _SemanticCache:
+    """Sorgu embedding'i uzerinden yaklasik tekrarlanan sorgulari yakalar.
+
+    Normalize edilmis embedding'ler (N, d) float32 matriste tutulur; arama tek
+    matris-vektor carpimi. Kapasite asilinca en eski kayit dusurulur.
+    """
+
+    def __init__(self, max_entries: int = 256, threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._matrix: Optional[np.ndarray] = None
+        self._payloads: List[Any] = []
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else vec
+
+    def lookup(self, embedding: List[float]) -> Optional[Any]:
+        if self._matrix is None:
+            return None
+        scores = self._matrix @ self._normalize(embedding)
+        idx = int(scores.argmax())
+        if float(scores[idx]) >= self.threshold:
+            return self._payloads[idx]
+        return None
+
+    def store(self, embedding: List[float], payload: Any) -> None:
+        vec = self._normalize(embedding)[None, :]
+        if self._matrix is None:
+            self._matrix = vec
+        else:
+            self._matrix = np.vstack((self._matrix, vec))
+        self._payloads.append(payload)
+        if len(self._payloads) > self.max_entries:
+            self._matrix = self._matrix[1:]
+            self._payloads.pop(0)
+
+
+# collection_name -> cache; RagService her istek icin kuruldugundan modul seviyesinde.
+_context_caches: Dict[str, _SemanticCache] = {}
+
+# Chroma handle'lari icin sinirli LRU + es zamanli ilk yukleme kilitleri.
+_vector_cache: "OrderedDict[str, Any]" = OrderedDict()
+_vector_locks: Dict[str, asyncio.Lock] = {}
+
+# Bos/alakasiz retrieval ile sonuclanan sorular: tekrarinda embedding +
+# HNSW aramasina hic girmeden fallback cevabi doner.
+_negative_cache: "OrderedDict[str, float]" = OrderedDict()
+_NEGATIVE_CACHE_TTL = 600.0
+_NEGATIVE_CACHE_MAX = 4096
+
+
+def _negative_key(tenant_id: str, question: str) -> str:
+    digest = hashlib.blake2b(
+        question.strip().lower().encode("utf-8"), digest_size=16
+    ).hexdigest()
+    return f"{tenant_id}:{digest}"
+
+
+def _negative_cache_has(key: str) -> bool:
+    ts = _negative_cache.get(key)
+    if ts is None:
+        return False
+    if time.monotonic() - ts >= _NEGATIVE_CACHE_TTL:
+        _negative_cache.pop(key, None)
+        return False
+    return True
+
+
+def _negative_cache_add(key: str) -> None:
+    _negative_cache[key] = time.monotonic()
+    _negative_cache.move_to_end(key)
+    while len(_negative_cache) > _NEGATIVE_CACHE_MAX:
+        _negative_cache.popitem(last=False)
+
+# Cevap sonrasi link temizligi: tum yeniden yazimlar tek alternation'da, metin
+# uzerinden tek geciste uygulanir.
+_LINK_REWRITE_RE = re.compile(
+    r"\[[^\]]*\]\((?P<mdurl>/downloads/[^)]+|https?://[^)]+?/downloads/[^)]+)\)"
+    r"|\[[^\]]*\]\(https?://[^)]+?/rapor/[^)]+\)"
+    r"|(?:^|(?<=\s))/downloads/[A-Za-z0-9._%\-]+"
+    r"|(?<!\()https?://[^\s)]+?/rapor/[^\s)]+"
+    r"|Buradan indirebilirsiniz"
+)
+_URL_MD_RE = re.compile(r"\((https?://[^)]+?/rapor/[^)]+)\)")
+_URL_PLAIN_RE = re.compile(r"(https?://[^\s)]+?/rapor/[^\s)]+)")
+
+
+def _link_repl(match: "re.Match[str]") -> str:
+    mdurl = match.group("mdurl")
+    if mdurl is not None:
+        return f"[rapor.pdf]({mdurl})"
+    return "rapor.pdf"
+
+
+# Bu belirteclerden hicbiri yoksa link temizligi calistirmaya gerek yok.
+_LINK_MARKERS = ("/downloads/", "/rapor/", "sandbox:", "Buradan indirebilirsiniz")
+
+# Basit selamlasmalar embedding/retrieval/LLM hattina hic girmez.
+_TRIVIAL_QUESTIONS = frozenset({"merhaba", "selam", "sa", "hi", "hello", "hey"})
+_TRIVIAL_REPLY = "Merhaba! Size nasil yardimci olabilirim?"
+
+# Varsayilan RAG prompt'u; import sirasinda bir kez kurulur.
+# Generic template since we don't have user roles anymore.
+_DEFAULT_PROMPT = (
+    "Sen site kullanicilarina yardim eden rehber asistanisin. "
+    "Verilen dokumanlardaki bilgileri kullanarak yanit ver.\n\n"
+    "ONEMLI KURALLAR:\n"
+    "1. Sadece verilen dokumanlardaki bilgileri kullan\n"
+    "2. Bilmedigin konularda 'Bu konuda yeterli bilgim yok' de\n"
+    "3. Detayli ve aciklayici cevaplar ver\n"
+    "4. Adim adim rehberlik et\n"
+    "5. Turkce cevap ver\n"
+    "6. Kisa ve net cevaplar ver\n\n"
+    "{memory}Site Rehberi:\n{context}\n\n"
+    "Kullanici Sorusu: {question}\n\nYanit:"
+)
+
+
+def _context_cache_for(collection_name: str) -> _SemanticCache:
+    cache = _context_caches.get(collection_name)
+    if cache is None:
+        cache = _context_caches[collection_name] = _SemanticCache()
+    return cache
+
+
+class _LLMBatcher:
+    """Es zamanli LLM cagrilarini kisa bir pencerede toplayip abatch ile gonderir.
+
+    Yogun trafikte N ayri chat-completion istegi yerine tek toplu istek;
+    bosta kalinca worker kendini kapatir.
+    """
+
+    def __init__(self, max_batch: int = 16, max_wait_ms: float = 20.0):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "asyncio.Queue" = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._dispatches: set = set()
+
+    async def ainvoke(self, llm, messages) -> Any:
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        await self._queue.put((llm, messages, future))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                first = await asyncio.wait_for(self._queue.get(), timeout=1.0)
+            except asyncio.TimeoutError:
+                # Timeout ile bu kontrol arasinda ainvoke kuyruga is birakmis
+                # olabilir; worker henuz done() olmadigi icin yenisi de
+                # dogmaz ve future sonsuza dek bekler. Kuyruk bos degilse
+                # kapanma, donguye don.
+                if not self._queue.empty():
+                    continue
+                return
+            batch = [first]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Ayni istemciye giden istekleri grupla ve beklemeden gonder.
+            grouped: Dict[int, list] = {}
+            for llm, messages, future in batch:
+                grouped.setdefault(id(llm), []).append((llm, messages, future))
+            for items in grouped.values():
+                task = asyncio.create_task(self._dispatch(items))
+                self._dispatches.add(task)
+                task.add_done_callback(self._dispatches.discard)
+
+    @staticmethod
+    async def _dispatch(items: list) -> None:
+        llm = items[0][0]
+        try:
+            results = await llm.abatch([messages for _, messages, _ in items])
+        except Exception as exc:
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, _, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
+
+
+_llm_batcher = _LLMBatcher(
+    max_batch=settings.llm_batch_max_size,
+    max_wait_ms=settings.llm_batch_window_ms,
+)
+
+
+# tenant_id -> tam cevap cache'i; yalnizca memory'siz (oturum bagimsiz) sorgularda
+# kullanilir ki baska oturumun baglamina gore uretilmis cevap sizmasin.
+_answer_caches: Dict[str, _SemanticCache] = {}
+
+
+def _answer_cache_for(tenant_id: str) -> _SemanticCache:
+    cache = _answer_caches.get(tenant_id)
+    if cache is None:
+        cache = _answer_caches[tenant_id] = _SemanticCache()
+    return cache
+
+
 class RagService:
     """Retrieve augmented generation helper."""
 
     def __init__(self, session_factory=None, vector=None, llm=None, tool_manager=None):  # Tool calling disabled
         self.session_factory = session_factory
-        self._vector_cache = {}
         self.vector = vector
         self.llm = llm
+        self._llm_lock = asyncio.Lock()
         # self.tool_manager = tool_manager or ToolManager()  # Tool calling disabled
 
     async def answer(
@@ -41,44 +262,138 @@ class RagService:
         tenant_id: str,
         memory_text: str = "",
     ) -> AnswerResult:
-        # Use tenant_id as collection name directly
-        collection_name = tenant_id
-        vector = self._get_vector(collection_name)
-        context_text = retrieve_context(
-            vector,
-            question,
-            tenant_id=tenant_id,
-            k=6,
-        )
-        if not context_text.strip():
+        question = question.strip()
+        if not question:
             return AnswerResult(text="Ne demek istediginizi anlayamadim")
+        if question.lower() in _TRIVIAL_QUESTIONS:
+            return AnswerResult(text=_TRIVIAL_REPLY)
+
+        # Ayni/benzer soru yakin zamanda cevaplandiysa LLM'e hic gitme.
+        answer_cache = None
+        query_embedding = None
+        if not memory_text:
+            answer_cache = _answer_cache_for(tenant_id)
+            vector = await self._get_vector(tenant_id)
+            query_embedding = await asyncio.to_thread(
+                embed_query_cached, vector._embedding_function, question
+            )
+            cached_text = answer_cache.lookup(query_embedding)
+            if cached_text is not None:
+                return AnswerResult(text=cached_text)
 
-        base_template = self._default_prompt()
-        prompt = PromptTemplate(
-            input_variables=["memory", "context", "question"],
-            template=base_template,
-        )
-        format_kwargs = {
-            "memory": memory_text,
-            "context": context_text,
-            "question": question,
-        }
+        format_kwargs = await self._prepare_format_kwargs(question, tenant_id, memory_text)
+        if format_kwargs is None:
+            return AnswerResult(text="Ne demek istediginizi anlayamadim")
+
+        # Akis gerekmeyen cagrilar batcher uzerinden gider: es zamanli istekler
+        # tek abatch cagrisinda birlesir.
+        prompt_text = _DEFAULT_PROMPT.format_map(format_kwargs)
+        llm = await self._get_llm()
+        message = await _llm_batcher.ainvoke(llm, [HumanMessage(content=prompt_text)])
+        text = (getattr(message, "content", "") or "").strip()
+
+        if answer_cache is not None and text:
+            answer_cache.store(query_embedding, text)
+        return AnswerResult(text=text)
+
+    async def answer_many(
+        self,
+        items: List[Tuple[str, str, str]],
+    ) -> List[AnswerResult]:
+        """(question, tenant_id, memory_text) uclularini es zamanli yanitlar.
+
+        Saglayici limitlerini asmamak icin es zamanliligi
+        MAX_LLM_CONCURRENCY ile sinirlar.
+        """
+        semaphore = asyncio.Semaphore(settings.max_llm_concurrency)
+
+        async def _one(question: str, tenant_id: str, memory_text: str) -> AnswerResult:
+            async with semaphore:
+                return await self.answer(question, tenant_id, memory_text=memory_text)
+
+        return list(await asyncio.gather(*(_one(q, t, m) for q, t, m in items)))
+
+    async def answer_stream(
+        self,
+        question: str,
+        tenant_id: str,
+        memory_text: str = "",
+    ) -> AsyncIterator[str]:
+        """Yaniti parca parca uretir; ilk token suresi tam cevabi beklemez."""
+        # Soruyu bir kez normalize et: cache anahtari, embedding ve prompt
+        # hepsi ayni kanonik formu kullanir ("Merhaba " ile "Merhaba" ayni).
+        question = question.strip()
+        if not question:
+            yield "Ne demek istediginizi anlayamadim"
+            return
+        if question.lower() in _TRIVIAL_QUESTIONS:
+            yield _TRIVIAL_REPLY
+            return
+
+        format_kwargs = await self._prepare_format_kwargs(question, tenant_id, memory_text)
+        if format_kwargs is None:
+            yield "Ne demek istediginizi anlayamadim"
+            return
+
+        # Sabit sablon + tek mesajlik akis icin LCEL zincirine (Runnable dispatch,
+        # callback kurulumu, ayri parser) gerek yok; dogrudan formatla ve gonder.
+        prompt_text = _DEFAULT_PROMPT.format_map(format_kwargs)
 
         # Tool calling disabled - skip tool processing
         # tool_specs = self.tool_manager.get_function_specs(profile_config)
         # if tool_specs:
-        #     prompt_text = prompt.format(**format_kwargs)
         #     prompt_text = self.tool_manager.inject_tool_instructions(prompt_text, profile_config)
-        #     return await self._run_with_tools(
-        #         prompt_text=prompt_text,
-        #         tenant_id=tenant_id,
-        #         tool_specs=tool_specs,
-        #     )
+        #     ... (bkz. _run_with_tools)
+
+        llm = await self._get_llm()
+        async for chunk in llm.astream([HumanMessage(content=prompt_text)]):
+            content = getattr(chunk, "content", "")
+            if content:
+                yield content
+
+    async def _prepare_format_kwargs(
+        self,
+        question: str,
+        tenant_id: str,
+        memory_text: str,
+    ) -> Optional[Dict[str, str]]:
+        """Retrieval'i calistirir; kullanilabilir context yoksa None doner."""
+        negative_key = _negative_key(tenant_id, question)
+        if _negative_cache_has(negative_key):
+            return None
 
-        llm = self._get_llm()
-        chain = prompt | llm | StrOutputParser()
-        output = await chain.ainvoke(format_kwargs)
-        return AnswerResult(text=(output or "").strip())
+        # Use tenant_id as collection name directly
+        collection_name = tenant_id
+        vector = await self._get_vector(collection_name)
+
+        # Ayni/benzer sorgularda embedding + HNSW aramasini atla.
+        context_cache = _context_cache_for(collection_name)
+        query_embedding = await asyncio.to_thread(
+            embed_query_cached, vector._embedding_function, question
+        )
+        cached = context_cache.lookup(query_embedding)
+        if cached is None:
+            context_text, top_score = await asyncio.to_thread(
+                retrieve_context,
+                vector,
+                question,
+                tenant_id=tenant_id,
+                k=6,
+                query_embedding=query_embedding,
+            )
+            context_cache.store(query_embedding, (context_text, top_score))
+        else:
+            context_text, top_score = cached
+        # Bos ya da alakasiz retrieval icin LLM cagrisina hic girme.
+        if not context_text.strip() or top_score < settings.rag_min_score:
+            _negative_cache_add(negative_key)
+            return None
+
+        return {
+            "memory": memory_text,
+            "context": context_text,
+            "question": question,
+        }
 
     async def _run_with_tools(
         self,
@@ -87,7 +402,7 @@ class RagService:
         tool_specs,
     ) -> AnswerResult:
         
-        llm_with_tools = self._get_llm().bind(functions=tool_specs, function_call="auto")
+        llm_with_tools = (await self._get_llm()).bind(functions=tool_specs, function_call="auto")
         human_message = HumanMessage(content=prompt_text)
         ai_message = await llm_with_tools.ainvoke([human_message])
         # Yeni OpenAI tool_calls semantigini once isle, yoksa eski function_call yoluna dus
@@ -101,24 +416,34 @@ class RagService:
 
         if tool_calls:
             followup_messages = [human_message, ai_message]
-            last_tool_output = None
-            for idx, call in enumerate(tool_calls, 1):
+            # Bagimsiz arac cagrilarini seri degil paralel calistir: toplam sure
+            # sum(t_i) yerine max(t_i) olur. Mesaj sirasi LLM'in bekledigi sirada kalir.
+            names = []
+            coros = []
+            for call in tool_calls:
                 fn = (call.get("function") or {})
                 name = fn.get("name") or call.get("name") or ""
                 arguments_json = fn.get("arguments") or call.get("arguments") or "{}"
-                try:
-                    tool_output = await self.tool_manager.execute(
+                names.append(name)
+                coros.append(
+                    self.tool_manager.execute(
                         tenant_id=tenant_id,
                         tool_name=name,
                         arguments_json=arguments_json,
                     )
-                    last_tool_output = tool_output
-                except (ToolExecutionError, json.JSONDecodeError) as exc:
-                    return AnswerResult(text=f"Arac cagrisinda hata olustu: {exc}")
+                )
+            outputs = await asyncio.gather(*coros, return_exceptions=True)
 
+            last_tool_output = None
+            for name, tool_output in zip(names, outputs):
+                if isinstance(tool_output, (ToolExecutionError, json.JSONDecodeError)):
+                    return AnswerResult(text=f"Arac cagrisinda hata olustu: {tool_output}")
+                if isinstance(tool_output, BaseException):
+                    raise tool_output
+                last_tool_output = tool_output
                 followup_messages.append(FunctionMessage(name=name, content=tool_output))
 
-            final_llm = self._get_llm()
+            final_llm = await self._get_llm()
             final_message = await final_llm.ainvoke(followup_messages)
             content = getattr(final_message, "content", "").strip()
             if content:
@@ -153,7 +478,7 @@ class RagService:
             content=tool_output,
         )
         followup_messages = [human_message, ai_message, function_response]
-        final_llm = self._get_llm()
+        final_llm = await self._get_llm()
         final_message = await final_llm.ainvoke(followup_messages)
         content = getattr(final_message, "content", "").strip()
         if content:
@@ -163,9 +488,20 @@ class RagService:
         return AnswerResult(text=content, files=attachments)
 
     def _extract_file_attachment(self, tool_output: str) -> Optional[Dict[str, Any]]:
+        # JSON nesnesi olmayan ciktilar icin parse etmeden hizli cikis;
+        # base64 yuklu buyuk ciktilarda orjson stdlib json'dan kat kat hizli.
+        if not tool_output:
+            return None
+        stripped = tool_output.lstrip()
+        if not stripped.startswith("{"):
+            return None
+        # Ek cikarabilecegimiz anahtarlardan hicbiri gecmiyorsa koca JSON
+        # agacini (ornegin base64 govdeyi) hic materialize etme.
+        if "downloads" not in stripped and "links" not in stripped and "pdf" not in stripped:
+            return None
         try:
-            payload = json.loads(tool_output or "{}")
-        except (TypeError, json.JSONDecodeError):
+            payload = orjson.loads(stripped)
+        except orjson.JSONDecodeError:
             return None
 
         downloads = payload.get("downloads")
@@ -185,13 +521,20 @@ class RagService:
                     candidate_entry = entry
                     break
             if candidate_entry is None:
+                # download_url tasiyan kayitlar da aday olsun; URL varken base64
+                # govdesine hic dokunmayiz.
                 for entry in links.values():
-                    if isinstance(entry, dict) and entry.get("content_base64"):
+                    if isinstance(entry, dict) and (
+                        entry.get("download_url") or entry.get("content_base64")
+                    ):
                         candidate_entry = entry
                         break
 
         if candidate_entry is None and isinstance(payload.get("pdf"), str):
-            pdf_data = payload["pdf"].strip()
+            pdf_data = payload["pdf"]
+            # Buyuk base64 govdesini sadece kenarinda bosluk varsa kopyala.
+            if pdf_data[:1].isspace() or pdf_data[-1:].isspace():
+                pdf_data = pdf_data.strip()
             if pdf_data:
                 return {
                     "name": "rapor.pdf",
@@ -220,8 +563,12 @@ class RagService:
 
         # (mevcut base64 geri dÃ¶nÃ¼ÅŸÃ¼ altta aynen kalsÄ±n)
         data = candidate_entry.get("content_base64")
-        if not isinstance(data, str) or not data.strip():
+        if not isinstance(data, str) or not data:
             return None
+        if data[:1].isspace() or data[-1:].isspace():
+            data = data.strip()
+            if not data:
+                return None
 
         name = candidate_entry.get("file_name") or "rapor.pdf"
         raw_type = (candidate_entry.get("content_type") or "pdf").strip().lower()
@@ -231,84 +578,72 @@ class RagService:
             "name": str(name),
             "type": str(content_type),
             "encoding": str(encoding),
-            "data": data.strip(),
+            "data": data,
         }
 
     def _format_download_links(self, text: str) -> str:
-        # Normalize any sandbox prefixes first
-        text = text.replace("sandbox:/app", "").replace("sandbox:", "")
-
-        # Replace markdown links pointing to /downloads/... with normalized labels
-        def normalize_label(match) -> str:
-            url = match.group("url")
-            return f"[rapor.pdf]({url})"
-
-        text = re.sub(
-            r"\[[^\]]*\]\((?P<url>(?:/downloads/[^)]+|https?://[^)]+?/downloads/[^)]+))\)",
-            normalize_label,
-            text,
-        )
+        # Link icermeyen siradan cevaplar icin hizli cikis.
+        if not any(marker in text for marker in _LINK_MARKERS):
+            return text
 
-        # Sadece satÄ±r baÅŸÄ±nda ya da boÅŸluktan sonra gelen "Ã§Ä±plak" /downloads/... metnini sadeleÅŸtir.
-        text = re.sub(r"(?:^|(?<=\s))/downloads/[A-Za-z0-9._%\-]+", "rapor.pdf", text)
+        # Normalize any sandbox prefixes first; iki replace da ancak prefix
+        # gercekten sizdiysa calissin.
+        if "sandbox:" in text:
+            text = text.replace("sandbox:/app", "").replace("sandbox:", "")
 
-        # Replace any external rapor URLs with plain filename
-        text = re.sub(
-            r"\[[^\]]*\]\((https?://[^)]+?/rapor/[^)]+)\)",
-            "rapor.pdf",
-            text,
-        )
-        text = re.sub(
-            r"(?<!\()(https?://[^\s)]+?/rapor/[^\s)]+)",
-            "rapor.pdf",
-            text,
-        )
-
-        # Fallback phrasing
-        text = text.replace("Buradan indirebilirsiniz", "rapor.pdf")
-        return text
+        # Markdown /downloads linklerini normalize et, /downloads ve /rapor
+        # URL'lerini ve fallback ifadesini sadelestir - hepsi tek taramada.
+        return _LINK_REWRITE_RE.sub(_link_repl, text)
 
     def _extract_url_attachment(self, text: str) -> Optional[Dict[str, Any]]:
+        if "/rapor/" not in text:
+            return None
         # Find first external rapor URL in markdown or plain text
-        md_match = re.search(r"\((https?://[^)]+?/rapor/[^)]+)\)", text)
+        md_match = _URL_MD_RE.search(text)
         if md_match:
             url = md_match.group(1).strip()
             return {"name": "rapor.pdf", "type": "application/pdf", "encoding": "url", "data": url}
-        plain_match = re.search(r"(https?://[^\s)]+?/rapor/[^\s)]+)", text)
+        plain_match = _URL_PLAIN_RE.search(text)
         if plain_match:
             url = plain_match.group(1).strip()
             return {"name": "rapor.pdf", "type": "application/pdf", "encoding": "url", "data": url}
         return None
 
-    def _get_vector(self, collection_name: str):
-        if collection_name not in self._vector_cache:
-            self._vector_cache[collection_name] = load_or_create_chroma(
-                settings.persist_dir,
-                collection_name=collection_name,
-            )
-        return self._vector_cache[collection_name]
-
-    def _get_llm(self):
-        if self.llm is not None:
-            return self.llm
-        self.llm = get_chat_llm()
+    async def _get_vector(self, collection_name: str):
+        vector = _vector_cache.get(collection_name)
+        if vector is None:
+            # Koleksiyon basina kilit: ayni anda gelen ilk istekler HNSW'yi
+            # iki kez yuklemesin.
+            lock = _vector_locks.setdefault(collection_name, asyncio.Lock())
+            async with lock:
+                vector = _vector_cache.get(collection_name)
+                if vector is None:
+                    vector = await asyncio.to_thread(
+                        load_or_create_chroma,
+                        settings.persist_dir,
+                        collection_name=collection_name,
+                    )
+                    _vector_cache[collection_name] = vector
+        _vector_cache.move_to_end(collection_name)
+        while len(_vector_cache) > settings.vector_cache_max:
+            _vector_cache.popitem(last=False)
+        return vector
+
+    async def prewarm(self, collection_names: Iterable[str]) -> None:
+        """Sicak tenant koleksiyonlarini istek yolu disinda yukler."""
+        for name in collection_names:
+            await self._get_vector(name)
+
+    async def _get_llm(self):
+        # Double-checked init: es zamanli ilk isteklerde istemci iki kez kurulmasin.
+        if self.llm is None:
+            async with self._llm_lock:
+                if self.llm is None:
+                    self.llm = get_chat_llm()
         return self.llm
 
     def _default_prompt(self) -> str:
-        # Use a generic template since we don't have user roles anymore
-        return (
-            "Sen site kullanicilarina yardim eden rehber asistanisin. "
-            "Verilen dokumanlardaki bilgileri kullanarak yanit ver.\n\n"
-            "ONEMLI KURALLAR:\n"
-            "1. Sadece verilen dokumanlardaki bilgileri kullan\n"
-            "2. Bilmedigin konularda 'Bu konuda yeterli bilgim yok' de\n"
-            "3. Detayli ve aciklayici cevaplar ver\n"
-            "4. Adim adim rehberlik et\n"
-            "5. Turkce cevap ver\n"
-            "6. Kisa ve net cevaplar ver\n\n"
-            "{memory}Site Rehberi:\n{context}\n\n"
-            "Kullanici Sorusu: {question}\n\nYanit:"
-        )
+        return _DEFAULT_PROMPT
 
 
 
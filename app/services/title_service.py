@@ -5,7 +5,7 @@ import asyncio
 import logging
 import uuid
 
-from sqlalchemy import select, update
+from sqlalchemy import func, or_, update
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from app.adapters.llm.openai_provider import get_chat_llm
@@ -13,6 +13,16 @@ from app.models.db_models import ChatSession
 
 logger = logging.getLogger(__name__)
 
+# Event loop task'lara yalnizca zayif referans tutar; baslik gorevleri bitene
+# kadar burada saklanmazsa GC tarafindan sessizce iptal edilebilir.
+_bg_tasks: set = set()
+
+# Ayni anda calisan baslik-LLM cagrisi sayisini sinirla.
+_title_llm_semaphore = asyncio.Semaphore(8)
+
+# Tek gecisli temizleme: ara string kopyalari yerine translate tablosu.
+_SANITIZE_TABLE = str.maketrans({"\n": " ", '"': None, "'": None})
+
 
 class TitleService:
     """Improve chat session titles based on the initial question."""
@@ -28,38 +38,35 @@ class TitleService:
         first_question: str,
     ) -> None:
         session_uuid = uuid.UUID(session_id)
-        result = await session.execute(
-            select(ChatSession.title, ChatSession.title_locked)
-            .where(
-                ChatSession.id == session_uuid,
-                ChatSession.tenant_id == tenant_id,
-            )
-        )
-        row = result.one_or_none()
-        if not row:
-            return
-        if row.title and bool(row.title_locked):
-            return
-
         fallback = self._sanitize(first_question[:60] if first_question else "Sohbet")
-        await session.execute(
+        # Tek UPDATE ... RETURNING: SELECT + UPDATE cift round-trip'i yerine
+        # coalesce mevcut basligi korur, satir donmezse oturum yok ya da kilitli.
+        result = await session.execute(
             update(ChatSession)
             .where(
                 ChatSession.id == session_uuid,
                 ChatSession.tenant_id == tenant_id,
-                ChatSession.title.is_(None),
+                or_(
+                    ChatSession.title.is_(None),
+                    ChatSession.title_locked.isnot(True),
+                ),
             )
-            .values(title=fallback)
+            .values(title=func.coalesce(ChatSession.title, fallback))
+            .returning(ChatSession.id)
         )
+        if result.first() is None:
+            return
 
-        asyncio.create_task(
-            self._upgrade_title_async(tenant_id, session_id, first_question)
+        task = asyncio.create_task(
+            self._upgrade_title_async(tenant_id, session_uuid, first_question)
         )
+        _bg_tasks.add(task)
+        task.add_done_callback(_bg_tasks.discard)
 
     async def _upgrade_title_async(
         self,
         tenant_id: str,
-        session_id: str,
+        session_uuid: uuid.UUID,
         first_question: str,
     ) -> None:
         try:
@@ -72,7 +79,8 @@ class TitleService:
                 "Ilk mesaj: {q}"
             ).format(tenant=tenant_id, q=first_question)
 
-            resp = await llm.ainvoke(prompt)
+            async with _title_llm_semaphore:
+                resp = await llm.ainvoke(prompt)
             better = getattr(resp, "content", str(resp)).strip()
             title = self._sanitize(better) or self._sanitize(first_question[:60] if first_question else "Sohbet")
 
@@ -81,19 +89,16 @@ class TitleService:
                     await session.execute(
                         update(ChatSession)
                         .where(
-                            ChatSession.id == uuid.UUID(session_id),
+                            ChatSession.id == session_uuid,
                             ChatSession.tenant_id == tenant_id,
                         )
                         .values(title=title)
                     )
         except Exception as exc:  # pragma: no cover
-            logger.warning("title upgrade failed for %s: %s", session_id, exc)
+            logger.warning("title upgrade failed for %s: %s", session_uuid, exc)
 
     def _sanitize(self, value: str) -> str:
-        sanitized = (value or "").strip()
-        sanitized = sanitized.replace("\n", " ").replace('"', "").replace("'", "")
-        while sanitized and sanitized[-1] in ".!?":
-            sanitized = sanitized[:-1]
+        sanitized = (value or "").translate(_SANITIZE_TABLE).strip().rstrip(".!?")
         if len(sanitized) > 80:
             sanitized = sanitized[:80].rstrip()
         return sanitized
@@ -1,13 +1,18 @@
 ﻿# app/services/tool_service.py
 from __future__ import annotations
 
-import json
+import orjson
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from weakref import WeakKeyDictionary
 
 # Tool system disabled - keeping minimal structure for compatibility
 
+# Profil basina bir kez kurulan arac indeksi; her cagrida tools listesini
+# lineer taramak yerine sozluk erisimi. Profil nesnesi GC edilince girdi duser.
+_profile_index: WeakKeyDictionary = WeakKeyDictionary()
+
 
 class ToolExecutionError(Exception):
     """Raised when a tool cannot be executed."""
@@ -46,12 +51,10 @@ class CurrentDateTimeTool(BaseTool):
 
     async def run(self, *, arguments: Dict[str, object], context: ToolContext) -> str:
         now = datetime.now(timezone.utc)
-        return json.dumps(
-            {
-                "utc_datetime": now.isoformat(),
-                "tenant_id": context.tenant_id,
-            }
-        )
+        # Sabit iki alanli cikti; dict kurup serialize etmek yerine dogrudan yaz.
+        # isoformat ve UUID tenant_id JSON-guvenli; yine de tirnak/ters bolu kac.
+        tenant = context.tenant_id.replace("\\", "\\\\").replace('"', '\\"')
+        return f'{{"utc_datetime":"{now.isoformat()}","tenant_id":"{tenant}"}}'
 
 
 class ToolManager:
@@ -62,25 +65,32 @@ class ToolManager:
             CurrentDateTimeTool.name: CurrentDateTimeTool(),
         }
 
+    def _index(
+        self, profile_config: ProfileConfig
+    ) -> Tuple[Dict[str, ToolConfig], List[Tuple[ToolConfig, BaseTool]], bool]:
+        cached = _profile_index.get(profile_config)
+        if cached is None:
+            by_name = {tool.name: tool for tool in profile_config.tools}
+            enabled = [
+                (tool, self._registry[tool.name])
+                for tool in profile_config.tools
+                if tool.enabled and tool.name in self._registry
+            ]
+            has_enabled = any(tool.enabled for tool in profile_config.tools)
+            cached = (by_name, enabled, has_enabled)
+            _profile_index[profile_config] = cached
+        return cached
+
     def get_function_specs(self, profile_config: ProfileConfig) -> List[Dict[str, object]]:
-        specs: List[Dict[str, object]] = []
-        for tool in profile_config.tools:
-            if not tool.enabled:
-                continue
-            impl = self._registry.get(tool.name)
-            if impl is not None:
-                specs.append(impl.function_spec())
-        return specs
+        _, enabled, _ = self._index(profile_config)
+        return [impl.function_spec() for _tool, impl in enabled]
 
     def describe_tools(self, profile_config: ProfileConfig) -> str:
-        descriptions = []
-        for tool in profile_config.tools:
-            if not tool.enabled:
-                continue
-            impl = self._registry.get(tool.name)
-            if impl is not None:
-                descriptions.append(f"- {tool.name}: {tool.description or impl.description}")
-        return "\n".join(descriptions)
+        _, enabled, _ = self._index(profile_config)
+        return "\n".join(
+            f"- {tool.name}: {tool.description or impl.description}"
+            for tool, impl in enabled
+        )
 
     def inject_tool_instructions(self, prompt_text: str, profile_config: ProfileConfig) -> str:
         tool_description = self.describe_tools(profile_config)
@@ -109,8 +119,8 @@ class ToolManager:
             raise ToolExecutionError(f"Arac etkin degil: {tool_name}")
 
         try:
-            arguments = json.loads(arguments_json or "{}")
-        except json.JSONDecodeError as exc:
+            arguments = orjson.loads(arguments_json or "{}")
+        except orjson.JSONDecodeError as exc:
             raise ToolExecutionError("Gecersiz arac argumanlari") from exc
 
         context = ToolContext(
@@ -120,12 +130,11 @@ class ToolManager:
         return await impl.run(arguments=arguments, context=context)
 
     def build_prompt_appendix(self, profile_config: ProfileConfig) -> str:
-        if not any(tool.enabled for tool in profile_config.tools):
+        _, _, has_enabled = self._index(profile_config)
+        if not has_enabled:
             return ""
         return "\n\nKullanilabilir araclar ile calisabilir ve gerekirse arac ciktisini kullanarak son cevabi olusturabilirsin."
 
     def _find_tool_config(self, profile_config: ProfileConfig, tool_name: str) -> Optional[ToolConfig]:
-        for tool in profile_config.tools:
-            if tool.name == tool_name:
-                return tool
-        return None
+        by_name, _, _ = self._index(profile_config)
+        return by_name.get(tool_name)
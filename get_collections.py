@@ -1,3 +1,5 @@
+import sys
+
 import chromadb
 from chromadb.config import Settings
 from pprint import pprint
@@ -5,6 +7,10 @@ from pprint import pprint
 persist_dir = r"C:\Users\impark-eray\Desktop\Eray\imchat\chroma_db"
 client = chromadb.PersistentClient(path=persist_dir, settings=Settings())
 
+# --all: tum metadata'yi tek toplu collection.get ile cek (satir basina
+# Python cagrisi yerine tek C-seviyesi fetch); varsayilan 3 satirlik peek.
+dump_all = "--all" in sys.argv[1:]
+
 collections = client.list_collections()
 for coll in collections:
     print(f"\n=== Collection: {coll.name} ===")
@@ -14,14 +20,18 @@ for coll in collections:
         print(f"  Unable to open collection: {exc}")
         continue
 
-    peek = collection.peek(limit=3)  # küçük bir örnek
-    metadatas = peek.get("metadatas", [])
-    ids = peek.get("ids", [])
+    if dump_all:
+        data = collection.get(include=["metadatas"])
+    else:
+        data = collection.peek(limit=3)  # küçük bir örnek
+    metadatas = data.get("metadatas", [])
+    ids = data.get("ids", [])
 
     if not metadatas:
         print("  (no documents or metadata found)")
         continue
 
+    print(f"  {len(ids)} document(s)")
     for idx, metadata in zip(ids, metadatas):
         print(f"  id={idx}")
         pprint(metadata)